@@ -1,16 +1,36 @@
 import pandas as pd
+import xlsxwriter
 from pathlib import Path
+from tls_cache import cache_is_fresh, load_tls_sheet, read_cache, write_cache
 
 # Hardcoded switch for template extraction
 TemplatesExtractProvided = 1  # 0 = original behavior, 1 = use AF templates
 
+# Columns read from the AF template reference workbook (BaseTemplate / AttributeConfigString are optional)
+TEMPLATE_COLUMNS = {"Name", "Parent", "ObjectType", "BaseTemplate", "AttributeConfigString"}
+
+def read_excel(path, **kwargs):
+    """pd.read_excel with the calamine engine (Rust parser, several times faster than openpyxl)"""
+    return pd.read_excel(path, engine="calamine", **kwargs)
+
+# TLS columns this script reads; SCADA Asset and Attribute Optimised are optional
+TLS_COLUMNS = ["P&ID Asset", "Asset Name", "Level 2", "Level 3", "SCADA Asset", "Attribute Optimised"]
+
+def load_template_sheet(template_path):
+    """Load the AF template reference workbook, caching it as Parquet next to the workbook"""
+    template_path = Path(template_path)
+    cache_path = template_path.with_suffix(".parquet")
+    if cache_is_fresh(cache_path, template_path):
+        return read_cache(cache_path)
+    return write_cache(read_excel(template_path, usecols=lambda col: col in TEMPLATE_COLUMNS), cache_path)
+
 def load_af_templates(template_file_path: str):
     """Load AF templates from reference Excel file"""
     if not Path(template_file_path).exists():
         print(f"Warning: Template file {template_file_path} not found. Using original behavior.")
         return None, None
     
-    template_df = pd.read_excel(template_file_path)
+    template_df = load_template_sheet(template_file_path)
     
     # Validate required columns
     required_cols = ["Name", "Parent", "ObjectType"]
@@ -20,39 +40,35 @@ def load_af_templates(template_file_path: str):
         return None, None
     
     # Separate element templates and attribute templates
-    element_templates = template_df[template_df["ObjectType"] == "ElementTemplate"].copy()
-    attribute_templates = template_df[template_df["ObjectType"] == "AttributeTemplate"].copy()
+    element_templates = template_df[template_df["ObjectType"] == "ElementTemplate"]
+    attribute_templates = template_df[template_df["ObjectType"] == "AttributeTemplate"]
     
     # Process templates to create a structured dictionary
     templates = {}
     
     # First pass: collect all direct attributes for each template
-    for _, elem_row in element_templates.iterrows():
-        template_name = elem_row["Name"]
-        base_template = elem_row.get("BaseTemplate", "")
-        
+    # BaseTemplate / AttributeConfigString are optional columns; reindex fills them with "" when absent
+    element_rows = element_templates.reindex(columns=["Name", "BaseTemplate"], fill_value="")
+    attr_rows = attribute_templates.reindex(columns=["Parent", "Name", "AttributeConfigString"], fill_value="")
+    # Extract TAGATTRIBUTE from every config string at once: the part after
+    # %@|Site Code%_%@|SCADA Asset Name%, lower-cased and stripped ("" for NaN, non-strings or no marker)
+    attr_rows["tag_attribute"] = (
+        attr_rows["AttributeConfigString"].astype(object)
+        .str.split("%@|Site Code%_%@|SCADA Asset Name%", regex=False).str[1]
+        .str.lower().str.strip()
+        .fillna("")
+    )
+    # (Name, tag_attribute, AttributeConfigString) of each element template, split by Parent in one pass
+    attrs_by_parent = {
+        parent: list(zip(group["Name"], group["tag_attribute"], group["AttributeConfigString"]))
+        for parent, group in attr_rows.groupby("Parent", sort=False)
+    }
+    for template_name, base_template in element_rows.itertuples(index=False, name=None):
         # Get attributes for this template
-        template_attrs = attribute_templates[attribute_templates["Parent"] == template_name]
-        attributes = []
-        
-        for _, attr_row in template_attrs.iterrows():
-            attr_config = attr_row.get("AttributeConfigString", "")
-            # Extract TAGATTRIBUTE from the config string
-            tag_attribute = ""
-            
-            # Check if attr_config is not NaN and is a string
-            if pd.notna(attr_config) and isinstance(attr_config, str):
-                if "%@|Site Code%_%@|SCADA Asset Name%" in attr_config:
-                    # Extract the part after %@|Site Code%_%@|SCADA Asset Name%
-                    parts = attr_config.split("%@|Site Code%_%@|SCADA Asset Name%")
-                    if len(parts) > 1:
-                        tag_attribute = parts[1].lower().strip()  # Convert to lowercase and strip whitespace
-            
-            attributes.append({
-                "name": attr_row["Name"],
-                "tag_attribute": tag_attribute,
-                "config_string": attr_config
-            })
+        attributes = [
+            {"name": attr_name, "tag_attribute": tag_attribute, "config_string": attr_config}
+            for attr_name, tag_attribute, attr_config in attrs_by_parent.get(template_name, [])
+        ]
         
         templates[template_name] = {
             "base_template": base_template,
@@ -61,27 +77,36 @@ def load_af_templates(template_file_path: str):
             "attribute_count": 0   # Will be updated after inheritance
         }
     
-    # Second pass: resolve inheritance and populate all_attributes
-    def get_all_attributes(template_name, visited=None):
-        """Recursively get all attributes including inherited ones"""
-        if visited is None:
-            visited = set()
+    # Second pass: resolve inheritance and populate all_attributes.
+    # Resolved lists are memoised per template, except where a circular reference cut the chain short:
+    # that result depends on which template the walk started from.
+    resolved = {}
+
+    def get_all_attributes(template_name, visited):
+        """Recursively get all attributes including inherited ones
+
+        Returns (attributes, complete); complete is False if a circular reference was cut.
+        """
+        if template_name in resolved:
+            return resolved[template_name], True
         
         if template_name in visited:
-            return []  # Avoid circular dependencies
-        
-        visited.add(template_name)
+            return [], False  # Avoid circular dependencies
         
         if template_name not in templates:
-            return []
+            return [], True
+        
+        # Inheritance is a single chain, so one mutable visited set is enough
+        visited.add(template_name)
         
         template = templates[template_name]
         all_attrs = template["direct_attributes"].copy()
+        complete = True
         
         # Add inherited attributes from base template
         base_template = template["base_template"]
         if base_template and base_template in templates:
-            inherited_attrs = get_all_attributes(base_template, visited.copy())
+            inherited_attrs, complete = get_all_attributes(base_template, visited)
             
             # Merge attributes (direct attributes override inherited ones with same name)
             existing_names = {attr["name"] for attr in all_attrs}
@@ -89,11 +114,14 @@ def load_af_templates(template_file_path: str):
                 if inherited_attr["name"] not in existing_names:
                     all_attrs.append(inherited_attr)
         
-        return all_attrs
+        visited.discard(template_name)
+        if complete:
+            resolved[template_name] = all_attrs
+        return all_attrs, complete
     
     # Populate all_attributes for each template
     for template_name in templates:
-        all_attrs = get_all_attributes(template_name)
+        all_attrs, _ = get_all_attributes(template_name, set())
         templates[template_name]["all_attributes"] = all_attrs
         templates[template_name]["attribute_count"] = len(all_attrs)
     
@@ -102,58 +130,55 @@ def load_af_templates(template_file_path: str):
     
     return sorted_templates, attribute_templates
 
-def match_assets_to_templates(df, templates):
-    """Match assets to templates based on attribute availability"""
+def match_assets_to_templates(df, templates, tls_full_df):
+    """Match assets to templates based on attribute availability in the (already loaded) TLS sheet"""
     if not templates:
         return df
     
-    # Load the main TLS data to get attribute information
-    tls_path = "data/TLS - Tags for AF rev 1.xlsx"
-    try:
-        tls_full_df = pd.read_excel(tls_path, sheet_name="PI System - Import Tags - Final")
-    except:
-        print("Warning: Could not load full TLS data for template matching")
-        return df
-    
     # Ensure we have the required column
     if "Attribute Optimised" not in tls_full_df.columns:
         print("Warning: 'Attribute Optimised' column not found in TLS data")
         return df
     
     # Create a mapping of P&ID Asset to their attributes
-    asset_attributes = {}
-    for _, row in tls_full_df.iterrows():
-        if pd.notna(row.get("P&ID Asset")) and pd.notna(row.get("Attribute Optimised")):
-            asset_name = str(row["P&ID Asset"]).strip()
-            attribute = str(row["Attribute Optimised"]).lower().strip()
-            
-            if asset_name not in asset_attributes:
-                asset_attributes[asset_name] = set()
-            asset_attributes[asset_name].add(attribute)
+    tagged = tls_full_df.dropna(subset=["P&ID Asset", "Attribute Optimised"])
+    asset_attributes = (
+        tagged["Attribute Optimised"].astype(str).str.lower().str.strip()
+        .groupby(tagged["P&ID Asset"].astype(str).str.strip(), sort=False)
+        .agg(set)
+        .to_dict()
+    )
     
     # Match assets to templates
     asset_template_mapping = {}
+    # Assets not matched yet, with their attribute counts; each template only scans what is left
+    unmatched = [(asset_name, asset_attrs, len(asset_attrs)) for asset_name, asset_attrs in asset_attributes.items()]
     
     # Try templates in order of most attributes first
     for template_name, template_info in templates.items():
-        required_attributes = set(attr["tag_attribute"] for attr in template_info["all_attributes"] if attr["tag_attribute"])
+        required_attributes = frozenset(attr["tag_attribute"] for attr in template_info["all_attributes"] if attr["tag_attribute"])
         
         # Skip templates with no valid attributes
         if not required_attributes:
             continue
         
-        matched_count = 0
-        # Find assets that have all required attributes and are not already matched
-        for asset_name, asset_attrs in asset_attributes.items():
-            if asset_name not in asset_template_mapping:  # Not already matched
-                if required_attributes.issubset(asset_attrs):
-                    asset_template_mapping[asset_name] = template_name
-                    matched_count += 1
+        required_count = len(required_attributes)
+        remaining = []
+        # Find assets that have all required attributes (an asset with fewer attributes cannot)
+        for asset in unmatched:
+            asset_name, asset_attrs, attr_count = asset
+            if attr_count >= required_count and required_attributes <= asset_attrs:
+                asset_template_mapping[asset_name] = template_name
+            else:
+                remaining.append(asset)
+        matched_count = len(unmatched) - len(remaining)
+        unmatched = remaining
         
         print(f"Template '{template_name}': matched {matched_count} assets with {len(required_attributes)} required attributes")
     
     # Add Template column to the dataframe
-    df["Template"] = df["P&ID Asset"].map(asset_template_mapping).fillna("")
+    # Few distinct template names: as a categorical the filters on Template compare integer codes
+    df["Template"] = df["P&ID Asset"].map(asset_template_mapping).fillna("").astype("category")
     
     return df
 
@@ -179,19 +204,9 @@ def build_af_import(
             print("No templates loaded, using original behavior")
     
     # --- Load inputs ---
-    tls_sheets = pd.read_excel(tls_path, sheet_name=None)
-    if "PI System - Import Tags - Final" in tls_sheets:
-        tls_df = tls_sheets["PI System - Import Tags - Final"]
-    else:
-        tls_df = None
-        for name, df in pd.read_excel(tls_path, sheet_name=None).items():
-            if {"P&ID Asset", "Asset Name", "Level 2", "Level 3"} <= set(df.columns):
-                tls_df = df
-                break
-        if tls_df is None:
-            raise ValueError("Could not find a sheet with required columns.")
+    tls_df = load_tls_sheet(tls_path, TLS_COLUMNS)
 
-    book_df = pd.read_excel(book2_path)
+    book_df = read_excel(book2_path, usecols=lambda col: col == "SecurityString")
 
     # Use SecurityString from Book2 if available; otherwise blank
     sec_str = ""
@@ -204,54 +219,57 @@ def build_af_import(
     if missing:
         raise ValueError(f"Missing required columns in TLS sheet: {missing}")
 
-    # Keep only rows with a P&ID Asset (that's the AF Element name)
-    df = tls_df.copy()
-    df = df[df["P&ID Asset"].notna()].copy()
+    # Keep only rows with a P&ID Asset (that's the AF Element name).
+    # tls_df only holds TLS_COLUMNS, and reset_index gives the one fresh frame the cleanup below writes into.
+    df = tls_df[tls_df["P&ID Asset"].notna()].reset_index(drop=True)
 
-    # Create SCADA Asset mapping before deduplication
+    # Create SCADA Asset mapping before deduplication (the last row wins for a repeated P&ID Asset)
     scada_asset_mapping = {}
-    for _, row in df.iterrows():
-        pid_asset = str(row["P&ID Asset"]).strip()
-        if pd.notna(row.get("SCADA Asset")):
-            scada_asset_value = str(row["SCADA Asset"]).strip()
-            scada_asset_mapping[pid_asset] = scada_asset_value
+    if "SCADA Asset" in df.columns:
+        has_scada = df["SCADA Asset"].notna()
+        scada_asset_mapping = dict(zip(
+            df.loc[has_scada, "P&ID Asset"].astype(str).str.strip(),
+            df.loc[has_scada, "SCADA Asset"].astype(str).str.strip()
+        ))
 
     # Normalise types/whitespace
     for col in ["P&ID Asset", "Asset Name", "Level 2", "Level 3"]:
         df[col] = df[col].astype(str).str.strip()
+    # Level 2 / Level 3 have few distinct values: as categoricals the dedup sort and drop_duplicates work on
+    # integer codes, and the str checks below run once per category instead of once per row
+    df[["Level 2", "Level 3"]] = df[["Level 2", "Level 3"]].astype("category")
 
     # Deduplicate by Element name (P&ID Asset) within its hierarchy
-    df.sort_values(by=["Level 2", "Level 3", "P&ID Asset"], inplace=True)
+    # (keeping the first Asset Name of each group after sorting, as groupby().first() did)
     dedup_cols = ["Level 2", "Level 3", "P&ID Asset"]
-    df = df.groupby(dedup_cols, as_index=False).agg({
-        "Asset Name": "first"
-    })
+    df = df.sort_values(dedup_cols).drop_duplicates(dedup_cols, keep="first", ignore_index=True)
+    df = df[dedup_cols + ["Asset Name"]]
+
+    # Hierarchy levels are stripped strings; "" and "nan" (missing cells) are not valid levels.
+    # Computed once here, before the template filter (so the filtered frame is never written to),
+    # and carried along with the rows into the Level 2/3 and leaf sections.
+    df["Level 2 ok"] = (df["Level 2"] != "") & (df["Level 2"].str.lower() != "nan")
+    df["Level 3 ok"] = (df["Level 3"] != "") & (df["Level 3"].str.lower() != "nan")
 
     # --- Apply template matching if enabled ---
     if TemplatesExtractProvided == 1 and templates:
         print("Matching assets to templates...")
-        df = match_assets_to_templates(df, templates)
+        df = match_assets_to_templates(df, templates, tls_df)
         # Filter to only include assets that have been matched to templates
         original_count = len(df)
-        df = df[df["Template"] != ""].copy()
+        df = df[df["Template"] != ""]
         matched_count = len(df)
         print(f"Filtered assets: {original_count} -> {matched_count} (only assets matching templates)")
     else:
         # Add empty Template column for consistency
         df["Template"] = ""
 
-    rows = []
-
-    def add_row(parent, name, description="", template=""):
-        # Add description to name with a ' - ' separator if description exists
-        display_name = name
-        if description:
-            display_name = f"{name} - {description}"
-            
-        rows.append({
+    def element_rows(parent, name, description="", template=""):
+        """Build Element rows; parent/name/description/template may be Series or scalars"""
+        return pd.DataFrame({
             "Selected(x)": "x",
             "Parent": parent,
-            "Name": display_name,
+            "Name": name,
             "ObjectType": "Element",
             "Error": "",
             "Description": description,
@@ -260,142 +278,108 @@ def build_af_import(
             "Value": ""
         })
 
-    def add_attribute_row(parent_element, attribute_name, attribute_value=""):
-        """Add an attribute row for setting attribute values"""
-        rows.append({
-            "Selected(x)": "x",
-            "Parent": parent_element,
-            "Name": attribute_name,
-            "ObjectType": "Attribute",
-            "Error": "",
-            "Description": "",
-            "SecurityString": "",
-            "Template": "",
-            "Value": attribute_value
-        })
-
     # Level 1 (root)
-    add_row(parent=pd.NA, name=level1_name, description="")
+    root_rows = element_rows(parent=pd.NA, name=pd.Series([level1_name]))
 
     # Level 2 elements
-    for l2 in df["Level 2"].dropna().unique():
-        if not str(l2).strip() or str(l2).lower() == "nan":
-            continue
-        add_row(parent=level1_name, name=str(l2), description="")
-
-    # Level 3 under each Level 2
-    for _, grp in df.groupby("Level 2", dropna=True):
-        l2_val = str(grp["Level 2"].iloc[0])
-        for l3_val in grp["Level 3"].dropna().unique():
-            if not str(l3_val).strip() or str(l3_val).lower() == "nan":
-                continue
-            add_row(parent=f"{level1_name}\\{l2_val}", name=str(l3_val), description="")
-
-    # Leaf elements: P&ID Asset under Level 3
-    # First, create a mapping of sensor assets for PID controller parent matching
-    sensor_assets = {}
-    controller_assets = []
-    regular_assets = []
-    
+    l2_names = df.loc[df["Level 2 ok"], "Level 2"].drop_duplicates()
+    level2_rows = element_rows(parent=level1_name, name=l2_names)
+
+    # Level 3 under each Level 2 (grouped by Level 2 in sorted order)
+    l23 = df[["Level 2", "Level 3", "Level 3 ok"]].drop_duplicates().sort_values("Level 2", kind="stable")
+    l23 = l23[l23["Level 3 ok"]]
+    level3_rows = element_rows(parent=level1_name + "\\" + l23["Level 2"].astype(str), name=l23["Level 3"])
+
+    # Leaf elements: P&ID Asset under Level 3, built column-wise
+    leaf = df[["Level 2", "Level 3", "Level 2 ok", "Level 3 ok", "P&ID Asset", "Asset Name", "Template"]]
     if TemplatesExtractProvided == 1 and templates:
-        # Separate sensors, controllers, and regular assets for proper ordering
-        for _, row in df.iterrows():
-            template = str(row["Template"]) if pd.notna(row["Template"]) else ""
-            pid_asset = str(row["P&ID Asset"])
-            
-            if template == "TLS.Analog.Sensor.001":
-                sensor_assets[pid_asset] = row
-            elif template == "TLS.PID.Controller.001":
-                controller_assets.append(row)
-            else:
-                regular_assets.append(row)
+        # Order: sensors first (they can be parents), then regular assets, then controllers
+        is_sensor = leaf["Template"] == "TLS.Analog.Sensor.001"
+        is_controller = leaf["Template"] == "TLS.PID.Controller.001"
+        # Sensors are keyed by name: one row per P&ID Asset, first-seen position, last row wins
+        sensors = leaf[is_sensor].drop_duplicates("P&ID Asset", keep="last").set_index("P&ID Asset")
+        sensors = sensors.loc[leaf.loc[is_sensor, "P&ID Asset"].drop_duplicates()].reset_index()
+        leaf = pd.concat([sensors, leaf[~is_sensor & ~is_controller], leaf[is_controller]], ignore_index=True)
     else:
         # If no templates, treat all as regular assets
-        regular_assets = df.to_dict('records')
-    
+        sensors = leaf.iloc[:0]
+        leaf = leaf.reset_index(drop=True)
+
+    pid = leaf["P&ID Asset"]
+    asset_name = leaf["Asset Name"]
+    display_name = pid.where(asset_name == "", pid + " - " + asset_name)
+
+    # Default parent path (hierarchy-based)
+    l2 = leaf["Level 2"].astype(str)
+    l3 = leaf["Level 3"].astype(str)
+    parent_path = level1_name + ("\\" + l2).where(leaf["Level 2 ok"], "") + ("\\" + l3).where(leaf["Level 3 ok"], "")
+
+    # Sensors occupy the first rows of leaf, so their display names line up positionally
+    sensor_display_names = dict(zip(sensors["P&ID Asset"], display_name.iloc[:len(sensors)]))
+
+    sensor_names = frozenset(sensor_display_names)
+
     def find_corresponding_sensor(controller_name):
         """Find corresponding sensor for a PID controller based on name pattern"""
         # Extract the base pattern by replacing 'C' with 'T'
         # Examples: LIC001 -> LIT001, PIC931 -> PIT931
         if len(controller_name) >= 3:
-            # Look for pattern where controller has 'C' and sensor has 'T'
-            for i, char in enumerate(controller_name):
-                if char == 'C':
-                    # Try replacing C with T
-                    potential_sensor = controller_name[:i] + 'T' + controller_name[i+1:]
-                    if potential_sensor in sensor_assets:
-                        return potential_sensor
+            # Try each 'C' from left to right (str.find jumps straight to them) replaced with 'T'
+            i = controller_name.find('C')
+            while i != -1:
+                potential_sensor = controller_name[:i] + 'T' + controller_name[i+1:]
+                if potential_sensor in sensor_names:
+                    return potential_sensor
+                i = controller_name.find('C', i + 1)
         return None
-    
-    def get_asset_display_name(pid_asset, asset_name):
-        """Get the full display name as it appears in the output"""
-        if asset_name:
-            return f"{pid_asset} - {asset_name}"
-        return pid_asset
-    
-    # Add assets in proper order: sensors first, then regular assets, then controllers
-    assets_to_process = []
-    
-    # 1. Add sensors first (they can be parents)
-    for sensor_name, row in sensor_assets.items():
-        assets_to_process.append(('sensor', row))
-    
-    # 2. Add regular assets 
-    for row in regular_assets:
-        assets_to_process.append(('regular', row))
-    
-    # 3. Add controllers last (they may be children of sensors)
-    for row in controller_assets:
-        assets_to_process.append(('controller', row))
-    
-    # Process assets in the determined order
-    for asset_type, row in assets_to_process:
-        l2 = str(row["Level 2"])
-        l3 = str(row["Level 3"])
-        pid_asset = str(row["P&ID Asset"])
-        asset_name = str(row["Asset Name"]) if pd.notna(row["Asset Name"]) else ""
-        template = str(row["Template"]) if pd.notna(row["Template"]) else ""
-        
-        # Default parent path (hierarchy-based)
-        parent_path = f"{level1_name}\\{l2}" if l2 and l2.lower() != "nan" else level1_name
-        if l3 and l3.lower() != "nan" and str(l3).strip():
-            parent_path = f"{parent_path}\\{l3}"
-        
-        # Special handling for PID Controllers - try to find corresponding sensor as parent
-        if asset_type == 'controller' and TemplatesExtractProvided == 1:
-            corresponding_sensor = find_corresponding_sensor(pid_asset)
+
+    # Special handling for PID Controllers - try to find corresponding sensor as parent.
+    # Only the (few) controller rows need this name-pattern search.
+    if TemplatesExtractProvided == 1 and templates:
+        for idx in leaf.index[leaf["Template"] == "TLS.PID.Controller.001"]:
+            corresponding_sensor = find_corresponding_sensor(pid[idx])
             if corresponding_sensor:
-                # Get the sensor's full display name and use it as parent
-                sensor_row = sensor_assets[corresponding_sensor]
-                sensor_asset_name = str(sensor_row["Asset Name"]) if pd.notna(sensor_row["Asset Name"]) else ""
-                sensor_display_name = get_asset_display_name(corresponding_sensor, sensor_asset_name)
-                parent_path = f"{parent_path}\\{sensor_display_name}"
-                print(f"Controller '{pid_asset}' will be child of sensor '{sensor_display_name}'")
-        
-        add_row(parent=parent_path, name=pid_asset, description=asset_name or "", template=template)
-        
-        # Add SCADA Asset Name attribute if this asset has a template
-        if template and template.strip() and TemplatesExtractProvided == 1:
-            # Get SCADA Asset value from the mapping we created earlier
-            scada_asset_value = scada_asset_mapping.get(pid_asset, "")
-            
-            # Create the element display name (same as what add_row creates)
-            element_display_name = pid_asset
-            if asset_name:
-                element_display_name = f"{pid_asset} - {asset_name}"
-                
-            # The parent for the attribute should be the full path to the element
-            full_element_path = f"{parent_path}\\{element_display_name}"
-                
-            # Add the SCADA Asset Name attribute row
-            add_attribute_row(full_element_path, "SCADA Asset Name", scada_asset_value)
-
-    out_df = pd.DataFrame(rows, columns=[
-        "Selected(x)","Parent","Name","ObjectType","Error","Description","SecurityString","Template","Value"
-    ])
-
-    # Save to Excel
-    out_df.to_excel(output_path, index=False)
+                sensor_display_name = sensor_display_names[corresponding_sensor]
+                parent_path[idx] = f"{parent_path[idx]}\\{sensor_display_name}"
+                print(f"Controller '{pid[idx]}' will be child of sensor '{sensor_display_name}'")
+
+    leaf_element_rows = element_rows(
+        parent=parent_path, name=display_name, description=asset_name, template=leaf["Template"]
+    )
+
+    # Add SCADA Asset Name attribute rows for assets that have a template
+    if TemplatesExtractProvided == 1:
+        has_template = leaf["Template"].str.strip() != ""
+    else:
+        has_template = pd.Series(False, index=leaf.index)
+    attribute_rows = pd.DataFrame({
+        "Selected(x)": "x",
+        # The parent for the attribute is the full path to the element
+        "Parent": (parent_path + "\\" + display_name)[has_template],
+        "Name": "SCADA Asset Name",
+        "ObjectType": "Attribute",
+        "Error": "",
+        "Description": "",
+        "SecurityString": "",
+        "Template": "",
+        "Value": pid[has_template].map(scada_asset_mapping).fillna("")
+    })
+
+    # Each attribute row shares its element's index, so a stable index sort places it right after the element
+    leaf_rows = pd.concat([leaf_element_rows, attribute_rows]).sort_index(kind="stable")
+
+    out_df = pd.concat([root_rows, level2_rows, level3_rows, leaf_rows], ignore_index=True)
+
+    # Save to Excel; xlsxwriter's constant_memory mode flushes each row to disk as soon as the next one starts,
+    # so rows are written in order here (pandas' to_excel writes column by column and would lose the data)
+    with xlsxwriter.Workbook(output_path, {"constant_memory": True}) as workbook:
+        worksheet = workbook.add_worksheet()
+        # Bold, bordered, centred header, as to_excel writes it
+        header_fmt = workbook.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+        worksheet.write_row(0, 0, out_df.columns, header_fmt)
+        cells = out_df.astype(object).where(out_df.notna(), None)
+        for row_idx, row in enumerate(cells.itertuples(index=False, name=None), start=1):
+            worksheet.write_row(row_idx, 0, row)
 
 if __name__ == "__main__":
     tls_path = "data/TLS - Tags for AF rev 1.xlsx"
@@ -1,19 +1,31 @@
+import numpy as np
 import pandas as pd
 from pathlib import Path
-import json
+import orjson
 import re
+from collections import Counter
+from tls_cache import load_tls_sheet
 
 # Hardcoded list of asset types to process in this script
 asset_types_to_process = ["Motor", "Motor VSD", "Valve", "Analog Sensor", "PID Controller",
                           "Control Valve", "Flowmeter Totaliser", "Filter"]  # Edit this list as needed
 
-# Import Excel file as DataFrame
+# TLS columns used by the sections below
+tls_columns = ['Asset Type Optimised', 'Attribute', 'P&ID Asset', 'SCADA Asset', 'Level 2', 'Level 3',
+               'Description', 'poInttype', 'engunits']
+
+# Import Excel file as DataFrame (cached as Parquet after the first run)
 excel_path = Path('data/TLS - Tags for AF rev 1.xlsx')
-df = pd.read_excel(excel_path)
+df = load_tls_sheet(excel_path, tls_columns)
 
 # Convert all attributes to lower case
 df['Attribute'] = df['Attribute'].astype(str).str.lower()
 
+# Categorical key columns: the filters and groupbys below work on integer codes instead of strings.
+# Groupbys on these columns pass observed=True so unused categories are not expanded.
+for col in ['Asset Type Optimised', 'Attribute', 'P&ID Asset', 'SCADA Asset', 'Level 2', 'Level 3']:
+    df[col] = df[col].astype('category')
+
 # Filter out rows where 'Level 3' is empty or NaN and only include asset types in asset_types_to_process
 df_filtered = df[
     df['Level 3'].notna() &
@@ -29,20 +41,71 @@ print(list(df_filtered.columns))
 print(df_wohierarchy.head(5))
 
 
-grouped = df_filtered.groupby('Asset Type Optimised')['P&ID Asset'].nunique()
+# Group by asset type once; every section below reuses these results
+by_asset_type = df_filtered.groupby('Asset Type Optimised', observed=True)
+grouped = by_asset_type['P&ID Asset'].nunique()
 grouped = grouped.sort_values(ascending=False)
 print(grouped)
 
+# Percentage of each asset type's assets that have each attribute
+attr_counts_per_type = df_filtered.groupby(['Asset Type Optimised', 'Attribute'], observed=True)['P&ID Asset'].nunique()
+attr_percent_per_type = attr_counts_per_type.div(grouped, level='Asset Type Optimised') * 100
+# Dense asset type x attribute matrix of those percentages (NaN where the type never has the attribute), with
+# its >70% threshold mask; every section reads these instead of re-deriving them per asset type
+attr_percent_matrix = attr_percent_per_type.unstack()
+attr_above_70 = attr_percent_matrix > 70
+
+def presence_matrix(frame, key):
+    """Boolean key x Attribute matrix: True where that asset has that attribute"""
+    return pd.crosstab(frame[key], frame['Attribute']) > 0
+
+def count_assets_with_all(presence, selected_attrs):
+    """Count the assets (rows of a presence matrix) that have every one of selected_attrs"""
+    matrix = presence.reindex(columns=selected_attrs, fill_value=False)
+    return int(matrix.to_numpy().all(axis=1).sum())
+
+# Rows without hierarchy, split by asset type once (instead of a full scan per asset type in each section); only looked
+# up by key, so the groups are left unsorted
+wohierarchy_by_type = dict(list(df_wohierarchy.groupby('Asset Type Optimised', observed=True, sort=False)))
+
+def wohierarchy_rows(asset_type):
+    """Rows of df_wohierarchy for one asset type (empty if there are none)"""
+    return wohierarchy_by_type.get(asset_type, df_wohierarchy.iloc[:0])
+
+# Asset x attribute presence per asset type, built once and shared by Sections 1, 2 and 4
+pid_presence = {asset_type: presence_matrix(group, 'P&ID Asset') for asset_type, group in by_asset_type}
+scada_presence = {asset_type: presence_matrix(group, 'SCADA Asset') for asset_type, group in wohierarchy_by_type.items()}
+
+def scada_presence_for(asset_type):
+    """SCADA Asset presence matrix of an asset type's rows without hierarchy (empty if there are none)"""
+    return scada_presence.get(asset_type, pd.DataFrame(dtype=bool))
+
+def process_asset_type(asset_type):
+    """
+    Everything the sections report for one asset type: its attribute percentages (highest first), the
+    attributes above 70%, and the assets with hierarchy / without hierarchy that have all of those attributes
+    """
+    attr_percent = attr_percent_matrix.loc[asset_type].dropna().sort_values(ascending=False)
+    filtered = attr_percent[attr_percent > 70]
+    selected_attrs = list(filtered.index)
+    count_all = count_assets_with_all(pid_presence[asset_type], selected_attrs)
+    count_wohierarchy = count_assets_with_all(scada_presence_for(asset_type), selected_attrs)
+    return attr_percent, filtered, count_all, count_wohierarchy
+
+# Per asset type with more than 2 assets (the only ones the sections report on), processed in one pass here;
+# every section below reads these results
+per_type = {asset_type: process_asset_type(asset_type) for asset_type in grouped[grouped > 2].index}
+
 # Section 1.
 print("\n=== Section 1: Attribute Templates and Coverage ===")
 print("This section finds template attributes for each asset type and shows attribute coverage for asset types with more than 2 assets.\n")
 
 # Find template attributes for each asset group with more than 2 assets
 templates = {}
-for asset_type, group in df_filtered.groupby('Asset Type Optimised'):
-    asset_attrs = group.groupby('P&ID Asset')['Attribute'].apply(set)
-    if len(asset_attrs) > 2:
-        template = set.intersection(*asset_attrs)
+for asset_type, asset_matrix in pid_presence.items():
+    if len(asset_matrix) > 2:
+        # Attributes every asset of this type has
+        template = set(asset_matrix.columns[asset_matrix.to_numpy().all(axis=0)])
         templates[asset_type] = template
 
 # Print templates only for asset types with more than 2 assets
@@ -56,32 +119,24 @@ print("\n--- Attribute Coverage by Asset Type ---")
 print("Shows, for each asset type, the percentage of assets that have each attribute (only attributes present in >70% of assets are shown).")
 for asset_type in grouped[grouped > 2].index:
     asset_count = grouped[asset_type]
-    group = df_filtered[df_filtered['Asset Type Optimised'] == asset_type]
-    attr_counts = group.groupby('Attribute')['P&ID Asset'].nunique()
-    attr_percent = (attr_counts / asset_count * 100).sort_values(ascending=False)
-    filtered = attr_percent[attr_percent > 70]
+    attr_percent, filtered, count_all, count_wohierarchy = per_type[asset_type]
     selected_attrs = list(filtered.index)
     if selected_attrs:
         print(f"\n{asset_type} (assets: {asset_count}):")
         for attr, percent in filtered.items():
             print(f"  {attr}: {percent:.1f}%")
-        # Count assets that have all selected attributes
-        assets_with_all = group.groupby('P&ID Asset')['Attribute'].apply(set)
-        count_all = (assets_with_all.apply(lambda attrs: set(selected_attrs).issubset(attrs))).sum()
+        # Assets that have all selected attributes
         percent_all = count_all / asset_count * 100
         print(f"\n  Assets with all above attributes: {count_all} ({percent_all:.1f}%)")
 
         # Also check in df_wohierarchy for assets with all selected attributes
-        assets_wohierarchy = df_wohierarchy[df_wohierarchy['Asset Type Optimised'] == asset_type]
-        assets_wohierarchy_grouped = assets_wohierarchy.groupby('SCADA Asset')['Attribute'].apply(set)
-        count_wohierarchy = (assets_wohierarchy_grouped.apply(lambda attrs: set(selected_attrs).issubset(attrs))).sum()
         print(f"  (In df_wohierarchy) Assets with all above attributes: {count_wohierarchy}")
 
 
 # Section 1.1. Analytics: which 'SCADA Asset' have different 'P&ID Asset'
 print("\n=== Section 1.1: SCADA Asset to P&ID Asset Mapping ===")
 print("This section lists SCADA Assets that are linked to more than one unique P&ID Asset.\n")
-scada_pid_counts = df_filtered.groupby('SCADA Asset')['P&ID Asset'].nunique()
+scada_pid_counts = df_filtered.groupby('SCADA Asset', observed=True)['P&ID Asset'].nunique()
 scada_with_multiple_pid = scada_pid_counts[scada_pid_counts > 1]
 if not scada_with_multiple_pid.empty:
     print("\nSection 1.1. SCADA Assets with multiple P&ID Assets:")
@@ -103,36 +158,30 @@ asset_types_for_csv = ["Motor", "Motor VSD", "Valve", "Analog Sensor", "PID Cont
 output_folder = Path("Attribute Matrix")
 output_folder.mkdir(exist_ok=True)
 
+def attribute_matrix(presence, index, columns):
+    """Build a 'yes'/'' matrix from a presence matrix with the given row and column order"""
+    present = presence.reindex(index=index, columns=columns, fill_value=False)
+    return pd.DataFrame(np.where(present.to_numpy(), 'yes', ''), index=index, columns=columns)
+
 for asset_type_for_csv in asset_types_for_csv:
-    group = df_filtered[df_filtered['Asset Type Optimised'] == asset_type_for_csv]
     asset_count = grouped.get(asset_type_for_csv, 0)
     if asset_count and asset_count > 2:
+        group = by_asset_type.get_group(asset_type_for_csv)
         # Get attribute percentages
-        attr_counts = group.groupby('Attribute')['P&ID Asset'].nunique()
-        attr_percent = (attr_counts / asset_count * 100).sort_values(ascending=False)
-        filtered_attrs = list(attr_percent[attr_percent > 70].index)
+        attr_percent, filtered, _, _ = per_type[asset_type_for_csv]
+        filtered_attrs = list(filtered.index)
         # All attributes: filtered first, then remaining by descending percentage
         all_attrs = list(filtered_attrs) + [attr for attr in attr_percent.index if attr not in filtered_attrs]
         # Get unique asset names from df_filtered
         assets = sorted([str(a) for a in group['P&ID Asset'].unique()])
         # Build DataFrame: rows=assets, columns=all_attrs
-        data = []
-        for asset in assets:
-            asset_attrs = set(group[group['P&ID Asset'] == asset]['Attribute'])
-            row = ['yes' if attr in asset_attrs else '' for attr in all_attrs]
-            data.append(row)
-        csv_df = pd.DataFrame(data, index=assets, columns=all_attrs)
+        csv_df = attribute_matrix(pid_presence[asset_type_for_csv], assets, all_attrs)
 
         # --- Add assets from df_wohierarchy ---
-        assets_wohierarchy = df_wohierarchy[df_wohierarchy['Asset Type Optimised'] == asset_type_for_csv]
+        assets_wohierarchy = wohierarchy_rows(asset_type_for_csv)
         scada_assets = sorted([str(a) for a in assets_wohierarchy['SCADA Asset'].unique() if pd.notna(a) and a != ''])
-        data_wohierarchy = []
-        for scada_asset in scada_assets:
-            asset_attrs = set(assets_wohierarchy[assets_wohierarchy['SCADA Asset'] == scada_asset]['Attribute'])
-            row = ['yes' if attr in asset_attrs else '' for attr in all_attrs]
-            data_wohierarchy.append(row)
-        if data_wohierarchy:
-            df_wohierarchy_matrix = pd.DataFrame(data_wohierarchy, index=scada_assets, columns=all_attrs)
+        if scada_assets:
+            df_wohierarchy_matrix = attribute_matrix(scada_presence_for(asset_type_for_csv), scada_assets, all_attrs)
             # Append to the main DataFrame
             csv_df = pd.concat([csv_df, df_wohierarchy_matrix], axis=0)
 
@@ -148,58 +197,39 @@ print("This section compares the filtered attribute sets (from previous section)
 # Collect filtered attribute sets for each asset type
 filtered_attr_sets = {}
 for asset_type in grouped[grouped > 2].index:
-    asset_count = grouped[asset_type]
-    group = df_filtered[df_filtered['Asset Type Optimised'] == asset_type]
-    attr_counts = group.groupby('Attribute')['P&ID Asset'].nunique()
-    attr_percent = (attr_counts / asset_count * 100).sort_values(ascending=False)
-    filtered = set(attr_percent[attr_percent > 70].index)
+    filtered = set(attr_percent_matrix.columns[attr_above_70.loc[asset_type].to_numpy()])
     if filtered:
         filtered_attr_sets[asset_type] = filtered
 
 # Compare sets and output similarity > 70%
+# One-hot asset type x attribute matrix: all pairwise intersections come from a single matrix product
 asset_types = list(filtered_attr_sets.keys())
-for i in range(len(asset_types)):
-    for j in range(i + 1, len(asset_types)):
-        at1, at2 = asset_types[i], asset_types[j]
-        set1, set2 = filtered_attr_sets[at1], filtered_attr_sets[at2]
-        if set1 and set2:
-            intersection = set1 & set2
-            union = set1 | set2
-            if union:
-                similarity = len(intersection) / len(union) * 100
-                if similarity > 70:
-                    print(f"{at1} <-> {at2}: {similarity:.1f}% similarity ({len(intersection)} shared of {len(union)} total attributes)")
+attr_index = {attr: k for k, attr in enumerate(sorted(set().union(*filtered_attr_sets.values())))}
+membership = np.zeros((len(asset_types), len(attr_index)), dtype=np.int64)
+for row, asset_type in enumerate(asset_types):
+    membership[row, [attr_index[attr] for attr in filtered_attr_sets[asset_type]]] = 1
+intersection = membership @ membership.T
+set_sizes = membership.sum(axis=1)
+union = set_sizes[:, None] + set_sizes[None, :] - intersection
+similarity = intersection / union * 100
+# Upper triangle only (each pair once), in the same i < j order as before
+for i, j in zip(*np.nonzero(np.triu(similarity > 70, k=1))):
+    print(f"{asset_types[i]} <-> {asset_types[j]}: {similarity[i, j]:.1f}% similarity ({intersection[i, j]} shared of {union[i, j]} total attributes)")
 
 # Section 4: Total Statistics and Coverage
 print("\n=== Section 4: Template Attribute Statistics and File Coverage ===")
 print("For each template, shows number of filtered attributes (from coverage section), number of assets with ALL attributes, and their product (total attributes for that template).")
 print("Sums all template-asset attributes and compares to total number of rows in the original file.\n")
 
-# Prepare filtered attribute counts per asset type (from coverage section)
-filtered_attrs_per_type = {}
-assets_with_all_per_type = {}
-for asset_type in grouped[grouped > 2].index:
-    asset_count = grouped[asset_type]
-    group = df_filtered[df_filtered['Asset Type Optimised'] == asset_type]
-    attr_counts = group.groupby('Attribute')['P&ID Asset'].nunique()
-    attr_percent = (attr_counts / asset_count * 100).sort_values(ascending=False)
-    filtered = attr_percent[attr_percent > 70]
-    selected_attrs = list(filtered.index)
-    filtered_attrs_per_type[asset_type] = selected_attrs
-    # Count assets that have all selected attributes
-    assets_with_all = group.groupby('P&ID Asset')['Attribute'].apply(set)
-    count_all = (assets_with_all.apply(lambda attrs: set(selected_attrs).issubset(attrs))).sum()
-    # Also add from df_wohierarchy
-    assets_wohierarchy = df_wohierarchy[df_wohierarchy['Asset Type Optimised'] == asset_type]
-    assets_wohierarchy_grouped = assets_wohierarchy.groupby('SCADA Asset')['Attribute'].apply(set)
-    count_wohierarchy = (assets_wohierarchy_grouped.apply(lambda attrs: set(selected_attrs).issubset(attrs))).sum()
-    assets_with_all_per_type[asset_type] = count_all + count_wohierarchy
+# Assets that have all selected attributes, plus those from df_wohierarchy
+assets_with_all_per_type = {asset_type: count_all + count_wohierarchy
+                            for asset_type, (_, _, count_all, count_wohierarchy) in per_type.items()}
 
 total_template_asset_attributes = 0
 print(f"{'Asset Type':30} {'#Attrs':>8} {'#Assets':>8} {'Total Attrs':>14}")
 print("-" * 60)
 for asset_type in grouped.index:
-    num_attrs = len(filtered_attrs_per_type.get(asset_type, []))
+    num_attrs = len(per_type[asset_type][1]) if asset_type in per_type else 0
     num_assets = assets_with_all_per_type.get(asset_type, 0)
     total_attrs = num_attrs * num_assets
     total_template_asset_attributes += total_attrs
@@ -219,6 +249,10 @@ else:
 print("\n=== Section 5: JSON Template Specifications ===")
 print("This section creates a JSON file with template specifications including name, description, attributes with descriptions, data types, and substitution patterns.\n")
 
+# Asset identifier at the start of a description (e.g. "NV2611 ") and whitespace runs; compiled once
+ASSET_ID_PREFIX_RE = re.compile(r'^[A-Z]+\d+[A-Z]*\s+')
+WHITESPACE_RE = re.compile(r'\s+')
+
 def extract_common_description_patterns(descriptions):
     """Extract common rightmost patterns from descriptions for template description"""
     if descriptions is None or len(descriptions) == 0:
@@ -239,52 +273,62 @@ def extract_common_description_patterns(descriptions):
     cleaned_descriptions = []
     for desc in valid_descriptions:
         # Remove asset identifiers at the beginning (e.g., NV2611, NV41107, etc.)
-        cleaned_desc = re.sub(r'^[A-Z]+\d+[A-Z]*\s+', '', desc)
+        cleaned_desc = ASSET_ID_PREFIX_RE.sub('', desc)
         cleaned_descriptions.append(cleaned_desc)
     
     # Try different rightmost substring lengths (starting from longer patterns)
     best_common = "Asset template"
     best_count = 0
     
+    # A pattern of a given length can only be counted by descriptions at least that long. Lengths where
+    # fewer than threshold (or no more than best_count) descriptions qualify cannot change the result.
+    desc_lengths = sorted((len(d) for d in cleaned_descriptions), reverse=True)
+    long_enough = 0
+    
     # Check rightmost substrings of different lengths (start from longer ones)
-    for length in range(min(50, max(len(d) for d in cleaned_descriptions)), 2, -1):  
-        rightmost_patterns = {}
+    for length in range(min(50, desc_lengths[0]), 2, -1):
+        while long_enough < len(desc_lengths) and desc_lengths[long_enough] >= length:
+            long_enough += 1
+        if long_enough < threshold or long_enough <= best_count:
+            continue
+        
+        rightmost_patterns = Counter()
         
         for desc in cleaned_descriptions:
             if len(desc) >= length:
                 # Get rightmost substring
                 rightmost = desc[-length:].strip()
                 # Clean up spacing
-                rightmost = re.sub(r'\s+', ' ', rightmost)
+                rightmost = WHITESPACE_RE.sub(' ', rightmost)
                 
                 if rightmost and len(rightmost) > 3:  # Only consider meaningful patterns
-                    rightmost_patterns[rightmost] = rightmost_patterns.get(rightmost, 0) + 1
+                    rightmost_patterns[rightmost] += 1
         
-        # Find pattern that appears most frequently and meets threshold
-        for pattern, count in sorted(rightmost_patterns.items(), key=lambda x: x[1], reverse=True):
+        # Take the most frequent pattern (the first seen on ties) if it meets the threshold
+        if rightmost_patterns:
+            pattern, count = max(rightmost_patterns.items(), key=lambda x: x[1])
             if count >= threshold and count > best_count:
                 best_common = pattern
                 best_count = count
-                break  # Take the most common pattern that meets threshold
     
     # If no rightmost pattern found, try finding common suffix words
     if best_count < threshold:
         # Split descriptions into words and find common endings
-        word_pattern_counts = {}
+        word_pattern_counts = Counter()
         for desc in cleaned_descriptions:
             words = desc.split()
             # Try different combinations of ending words
             for i in range(1, min(5, len(words) + 1)):  # Check 1-4 ending words
                 ending = ' '.join(words[-i:])
                 if len(ending) > 3:  # Only meaningful endings
-                    word_pattern_counts[ending] = word_pattern_counts.get(ending, 0) + 1
+                    word_pattern_counts[ending] += 1
         
-        # Find most common ending that meets threshold
-        for pattern, count in sorted(word_pattern_counts.items(), key=lambda x: x[1], reverse=True):
+        # Take the most common ending (the first seen on ties) if it meets the threshold
+        if word_pattern_counts:
+            pattern, count = max(word_pattern_counts.items(), key=lambda x: x[1])
             if count >= threshold and count > best_count:
                 best_common = pattern
                 best_count = count
-                break
     
     # Final fallback
     if best_common == "Asset template" or best_count == 0:
@@ -337,10 +381,8 @@ templates_json = {
 # Process each asset type with filtered attributes
 for asset_type in grouped[grouped > 2].index:
     asset_count = grouped[asset_type]
-    group = df_filtered[df_filtered['Asset Type Optimised'] == asset_type]
-    attr_counts = group.groupby('Attribute')['P&ID Asset'].nunique()
-    attr_percent = (attr_counts / asset_count * 100).sort_values(ascending=False)
-    filtered_attrs = attr_percent[attr_percent > 70]
+    group = by_asset_type.get_group(asset_type)
+    attr_percent, filtered_attrs, _, _ = per_type[asset_type]
     
     if len(filtered_attrs) > 0:
         print(f"Processing template for {asset_type}...")
@@ -349,25 +391,18 @@ for asset_type in grouped[grouped > 2].index:
         asset_descriptions = group['Description'].unique()
         template_description = extract_common_description_patterns(asset_descriptions)
         
+        # First non-null description / point type / eng units of every attribute, in one (unsorted, .loc-indexed) groupby
+        attr_firsts = group.groupby('Attribute', observed=True, sort=False)[['Description', 'poInttype', 'engunits']].first()
+        
         # Create attributes list
         attributes_list = []
         for attr in filtered_attrs.index:
-            attr_group = group[group['Attribute'] == attr]
+            attr_desc, pointtype, engunit = attr_firsts.loc[attr]
             
-            # Get most common description for this attribute
-            attr_descriptions = attr_group['Description'].dropna()
-            if len(attr_descriptions) > 0:
-                attr_desc = attr_descriptions.iloc[0]  # Take first non-null description
-            else:
+            # Fall back to a generic description when the attribute has none
+            if pd.isna(attr_desc):
                 attr_desc = f"{attr} attribute for {asset_type}"
             
-            # Get most common point type and eng units
-            pointtypes = attr_group['poInttype'].dropna()
-            engunits = attr_group['engunits'].dropna()
-            
-            pointtype = pointtypes.iloc[0] if len(pointtypes) > 0 else None
-            engunit = engunits.iloc[0] if len(engunits) > 0 else None
-            
             # Map to AVEVA data type
             aveva_datatype = map_to_aveva_datatype(pointtype, engunit)
             
@@ -376,12 +411,12 @@ for asset_type in grouped[grouped > 2].index:
             
             attribute_spec = {
                 "name": attr,
-                "description": str(attr_desc) if pd.notna(attr_desc) else f"{attr} attribute",
+                "description": str(attr_desc),
                 "data_type": aveva_datatype,
                 "engineering_units": str(engunit) if pd.notna(engunit) else "",
                 "point_type": str(pointtype) if pd.notna(pointtype) else "",
                 "substitution_pattern": substitution,
-                "coverage_percentage": round(filtered_attrs[attr], 1),
+                "coverage_percentage": float(round(filtered_attrs[attr], 1)),
                 "pi_point_config": {
                     "point_source": "L",
                     "point_class": "classic",
@@ -411,8 +446,8 @@ for asset_type in grouped[grouped > 2].index:
 
 # Save JSON file
 json_output_path = Path("AF_Templates_Specification.json")
-with open(json_output_path, 'w', encoding='utf-8') as f:
-    json.dump(templates_json, f, indent=2, ensure_ascii=False)
+# orjson (Rust) writes UTF-8 directly; OPT_INDENT_2 matches json.dump(indent=2, ensure_ascii=False)
+json_output_path.write_bytes(orjson.dumps(templates_json, option=orjson.OPT_INDENT_2))
 
 print(f"\nJSON template specification saved to: {json_output_path.resolve()}")
 print(f"Total templates created: {len(templates_json['templates'])}")
@@ -8,11 +8,36 @@ via the PI Builder Excel Add-on.
 The CSV file format matches the structure in TemplateExcelFileExample.csv.
 """
 
-import pandas as pd
+import csv
 import json
+import os
 from pathlib import Path
 from datetime import datetime
 
+# PI Builder column headers
+HEADERS = [
+    "Selected(x)", "Parent", "Name", "ObjectType", "Error", "Description", "SecurityString",
+    "Type", "AllowElementToExtend", "BaseTemplateOnly", "Categories", "AttributeIsHidden",
+    "AttributeIsManualDataEntry", "AttributeIsConfigurationItem", "AttributeIsExcluded",
+    "AttributeIsIndexed", "AttributeDefaultUOM", "AttributeType", "AttributeDefaultValue",
+    "AttributeDataReference", "AttributeConfigString", "AttributeDisplayDigits", "", ""
+]
+
+# Empty row written after each template
+SEPARATOR_ROW = [""] * len(HEADERS)
+
+# Security string similar to example
+SECURITY_STRING = "Administrators:A(r,w,rd,wd,d,x,a,s,so,an)|Engineers:A(r,w,rd,wd,d,x,s,so,an)|World:A(r,rd)|Asset Analytics:A(r,w,rd,wd,x,an)|Asset Analytics Recalculation:A(x)|RTQP Engine:A(r,rd)"
+
+# Map JSON data types to AF attribute types
+ATTR_TYPE_MAP = {
+    "Boolean": "Boolean",
+    "Float64": "Double",
+    "Int32": "Int32",
+    "String": "String",
+    "DateTime": "DateTime"
+}
+
 def load_template_json(json_path):
     """Load the JSON template specification file"""
     with open(json_path, 'r', encoding='utf-8') as f:
@@ -28,51 +53,37 @@ def create_pi_builder_excel(templates_data, output_path):
     - Followed by AttributeTemplate rows for that template's attributes
     """
     
-    # Create the data rows following the example structure
-    data_rows = []
-    
-    # Add header row
-    headers = [
-        "Selected(x)", "Parent", "Name", "ObjectType", "Error", "Description", "SecurityString",
-        "Type", "AllowElementToExtend", "BaseTemplateOnly", "Categories", "AttributeIsHidden",
-        "AttributeIsManualDataEntry", "AttributeIsConfigurationItem", "AttributeIsExcluded",
-        "AttributeIsIndexed", "AttributeDefaultUOM", "AttributeType", "AttributeDefaultValue",
-        "AttributeDataReference", "AttributeConfigString", "AttributeDisplayDigits", "", ""
-    ]
-    data_rows.append(headers)
-    
-    # Process each template
-    for template in templates_data["templates"]:
-        # Add ElementTemplate row
-        template_row = create_element_template_row(template)
-        data_rows.append(template_row)
+    # Write the rows following the example structure straight to CSV
+    # (os.linesep line endings, as pandas to_csv wrote them)
+    with open(output_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, lineterminator=os.linesep)
         
-        # Add AttributeTemplate rows for this template
-        for attr in template["attributes"]:
-            attr_row = create_attribute_template_row(template, attr)
-            data_rows.append(attr_row)
+        # Add header row
+        writer.writerow(HEADERS)
         
-        # Add empty separator rows
-        data_rows.append([""] * len(headers))
-        data_rows.append([""] * len(headers))
+        # Process each template
+        for template in templates_data["templates"]:
+            # Template name with TLS prefix
+            template_name = f"TLS.{template['name'].replace(' ', '.')}.001"
+            
+            # Add ElementTemplate row
+            writer.writerow(create_element_template_row(template, template_name))
+            
+            # Add AttributeTemplate rows for this template
+            writer.writerows(create_attribute_template_row(template_name, attr) for attr in template["attributes"])
+            
+            # Add empty separator rows
+            writer.writerow(SEPARATOR_ROW)
+            writer.writerow(SEPARATOR_ROW)
     
-    # Create DataFrame and save as CSV
-    df = pd.DataFrame(data_rows)
-    df.to_csv(output_path, index=False, header=False)
     print(f"PI Builder CSV file saved to: {output_path}")
 
-def create_element_template_row(template):
+def create_element_template_row(template, template_name):
     """Create a row for ElementTemplate definition"""
     
-    # Create security string similar to example
-    security_string = "Administrators:A(r,w,rd,wd,d,x,a,s,so,an)|Engineers:A(r,w,rd,wd,d,x,s,so,an)|World:A(r,rd)|Asset Analytics:A(r,w,rd,wd,x,an)|Asset Analytics Recalculation:A(x)|RTQP Engine:A(r,rd)"
-    
     # Create categories string
     categories = f"Basic Asset;TLS;{template['name']};"
     
-    # Template name with TLS prefix
-    template_name = f"TLS.{template['name'].replace(' ', '.')}.001"
-    
     row = [
         "x",  # Selected(x)
         "",   # Parent (empty for ElementTemplate)
@@ -80,7 +91,7 @@ def create_element_template_row(template):
         "ElementTemplate",  # ObjectType
         "",   # Error
         f"{template['name']} Template",  # Description
-        security_string,  # SecurityString
+        SECURITY_STRING,  # SecurityString
         "None",  # Type
         "FALSE",  # AllowElementToExtend
         "FALSE",  # BaseTemplateOnly
@@ -102,22 +113,10 @@ def create_element_template_row(template):
     
     return row
 
-def create_attribute_template_row(template, attr):
+def create_attribute_template_row(template_name, attr):
     """Create a row for AttributeTemplate definition"""
     
-    # Template name with TLS prefix
-    template_name = f"TLS.{template['name'].replace(' ', '.')}.001"
-    
-    # Map data types
-    attr_type_map = {
-        "Boolean": "Boolean",
-        "Float64": "Double", 
-        "Int32": "Int32",
-        "String": "String",
-        "DateTime": "DateTime"
-    }
-    
-    attr_type = attr_type_map.get(attr["data_type"], "Double")
+    attr_type = ATTR_TYPE_MAP.get(attr["data_type"], "Double")
     
     # Default value based on type
     default_value = "FALSE" if attr_type == "Boolean" else "0"
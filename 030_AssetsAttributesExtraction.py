@@ -41,6 +41,9 @@ import re
 INPUT_PATH = Path("TNP/TNP - Tags - PI Builder Fromat - 20250624.xlsx")
 SHEET_NAME = "PI System - Import Tags - Final"
 
+# xlsxwriter options for the rewritten workbooks: keep URL-like strings as plain text, as openpyxl wrote them
+XLSXWRITER_KWARGS = {"options": {"strings_to_urls": False}}
+
 
 # No defaults: input file and sheet name are required via CLI
 
@@ -120,7 +123,7 @@ def process_file(input_path: Path, sheet_name: str) -> Path:
 	timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
 	backup_path = input_path.with_suffix("")
 	backup_path = backup_path.parent / f"{backup_path.name}.backup-{timestamp}.xlsx"
-	with pd.ExcelWriter(backup_path, engine="openpyxl") as writer:
+	with pd.ExcelWriter(backup_path, engine="xlsxwriter", engine_kwargs=XLSXWRITER_KWARGS) as writer:
 		for sn, sdf in sheets_original.items():
 			sdf.to_excel(writer, sheet_name=sn, index=False)
 	print(f"Backup written: {backup_path}")
@@ -141,7 +144,7 @@ def process_file(input_path: Path, sheet_name: str) -> Path:
 	# Build updated sheets mapping
 	sheets_updated = dict(sheets_original)
 	sheets_updated[sheet_name] = df
-	with pd.ExcelWriter(out_path, engine="openpyxl") as writer:
+	with pd.ExcelWriter(out_path, engine="xlsxwriter", engine_kwargs=XLSXWRITER_KWARGS) as writer:
 		for sn, sdf in sheets_updated.items():
 			sdf.to_excel(writer, sheet_name=sn, index=False)
 
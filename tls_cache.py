@@ -0,0 +1,73 @@
+"""
+tls_cache.py
+
+Parquet caches of the Excel inputs, shared by 010_TreeTagList.py and 020_TemplateExtraction.py.
+
+Each workbook is cached as a .parquet file next to it and reused while the cache is at least as new as
+the workbook. Both scripts read the TLS sheet through load_tls_sheet, so they always see the same cache.
+"""
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from pathlib import Path
+
+TLS_SHEET_NAME = "PI System - Import Tags - Final"
+
+def stringify_object_columns(frame):
+    """Turn the non-null cells of object columns into str, so a column mixing text and numbers can be written to Parquet
+
+    Missing cells stay NaN.
+    """
+    for col in frame.columns[frame.dtypes == object]:
+        values = frame[col]
+        frame[col] = values.where(values.isna(), values.astype(str))
+    return frame
+
+def cache_is_fresh(cache_path, source_path):
+    """True if the Parquet cache exists and is at least as new as the workbook it was built from"""
+    return cache_path.exists() and cache_path.stat().st_mtime >= source_path.stat().st_mtime
+
+def read_cache(cache_path, columns=None):
+    """Read a Parquet cache; if columns is given, only those of them present in the cache are decoded"""
+    if columns is not None:
+        cached_columns = pq.read_schema(cache_path).names
+        columns = [c for c in columns if c in cached_columns]
+    cached = pd.read_parquet(cache_path, engine="pyarrow", columns=columns)
+    # Parquet gives None for missing strings; restore the NaN read_excel produces
+    return cached.where(cached.notna(), np.nan)
+
+def write_cache(frame, cache_path):
+    """Write a freshly parsed sheet to its Parquet cache; returns the (stringified) frame that was cached"""
+    frame = stringify_object_columns(frame)
+    frame.to_parquet(cache_path, compression="zstd", engine="pyarrow")
+    return frame
+
+def load_tls_sheet(tls_path, columns=None):
+    """Load the TLS tag sheet, caching it as Parquet next to the workbook
+
+    If columns is given, only those of them present in the sheet are returned.
+    The cache always holds the whole sheet, since 010 and 020 read different columns from it.
+    """
+    tls_path = Path(tls_path)
+    cache_path = tls_path.with_suffix(".parquet")
+    if cache_is_fresh(cache_path, tls_path):
+        return read_cache(cache_path, columns)
+
+    # Parse only the sheet that is needed, not every sheet in the workbook
+    with pd.ExcelFile(tls_path, engine="calamine") as workbook:
+        if TLS_SHEET_NAME in workbook.sheet_names:
+            tls_df = write_cache(workbook.parse(TLS_SHEET_NAME), cache_path)
+        else:
+            # Fallback sheets are not cached; the cache always holds TLS_SHEET_NAME.
+            # Only the header row is parsed to find the first sheet with the hierarchy columns.
+            for name in workbook.sheet_names:
+                if {"P&ID Asset", "Asset Name", "Level 2", "Level 3"} <= set(workbook.parse(name, nrows=0).columns):
+                    tls_df = workbook.parse(name)
+                    break
+            else:
+                raise ValueError("Could not find a sheet with required columns.")
+
+    if columns is not None:
+        tls_df = tls_df[[c for c in columns if c in tls_df.columns]]
+    return tls_df